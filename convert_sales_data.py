@@ -0,0 +1,7 @@
+import pandas as pd
+
+# Regenerates sales_data.parquet, which sales_what_if_rootcause.py reads, from
+# sales_data.csv. Re-run it whenever sales_data.csv changes.
+pd.read_csv("E:/whatif/sales_data.csv").to_parquet(
+    "E:/whatif/sales_data.parquet", engine="pyarrow", compression="zstd", index=False
+)
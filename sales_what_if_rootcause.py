@@ -1,12 +1,151 @@
+import numpy as np
 import pandas as pd
+import polars as pl
 import streamlit as st
 
 # --- Loading Data --- 
+# sales_data.parquet is generated from sales_data.csv by convert_sales_data.py
+DATA_PATH = "E:/whatif/sales_data.parquet"
+NEEDED = [
+    "DSM", "ASE", "SO_Territory",
+    "Manpower Plan", "Manpower Actual",
+    "Mandays Actual",
+    "Unique Routes Plan", "Unique Routes Actual",
+    "Unique Callage Actual",
+    "Productivity Actual",
+    "Secondary INR Plan", "Secondary INR Actual",
+    "UBO Plan", "UBO Actual",
+    "ULS Retailer", "ULS DB",
+    "TP per Outlet Plan", "TP per Outlet Actual",
+]
+
+# KPI columns aggregated together in one pass over the filtered rows
+SUM_COLS = [
+    "Manpower Plan", "Manpower Actual",
+    "Mandays Actual",
+    "Unique Routes Plan", "Unique Routes Actual",
+    "Unique Callage Actual",
+    "Productivity Actual",
+    "Secondary INR Plan", "Secondary INR Actual",
+    "UBO Plan", "UBO Actual",
+    "ULS Retailer", "ULS DB",
+]
+MEAN_COLS = ["TP per Outlet Plan", "TP per Outlet Actual"]
+
+# Count-like KPI columns are stored as float64 in the source but are expected to be
+# whole numbers; load_data narrows them to int32 only when every value is whole.
+# Fractional columns (callage, INR, TP) stay float64
+KPI_DTYPES = {
+    "Manpower Plan": pl.Int32,
+    "Manpower Actual": pl.Int32,
+    "Mandays Actual": pl.Int32,
+    "Unique Routes Plan": pl.Int32,
+    "Unique Routes Actual": pl.Int32,
+    "Productivity Actual": pl.Int32,
+    "UBO Plan": pl.Int32,
+    "UBO Actual": pl.Int32,
+    "ULS Retailer": pl.Int32,
+    "ULS DB": pl.Int32,
+}
+
+def unique_sorted(frame, col):
+    return frame.get_column(col).drop_nulls().unique().sort().to_list()
+
 @st.cache_data
 def load_data():
-    return pd.read_csv("E:/whatif/sales_data.csv")
+    # Check the schema once, up front, so every KPI column can be read unguarded below
+    missing = [c for c in NEEDED if c not in pl.read_parquet_schema(DATA_PATH)]
+    if missing:
+        st.error(f"sales_data.parquet is missing required columns: {', '.join(missing)}")
+        st.stop()
+
+    df = pl.read_parquet(DATA_PATH, columns=NEEDED)
+
+    # A float -> Int32 cast truncates silently, so a column with any fractional
+    # value is left as float64 rather than narrowed
+    whole = df.select((pl.col(c) % 1 == 0).all() for c in KPI_DTYPES).row(0, named=True)
+    df = df.cast({c: dtype for c, dtype in KPI_DTYPES.items() if whole[c]})
+
+    # Filter keys as sorted Enums: comparisons run on integer codes and the
+    # category list doubles as the sorted dropdown list
+    df = df.with_columns(
+        pl.col(c).cast(pl.Enum(unique_sorted(df, c))) for c in ("DSM", "ASE", "SO_Territory")
+    ).rechunk()  # one contiguous buffer per column for the group_by/agg kernels
+
+    # Dropdown lookups, built once so the cascading selectors never rescan df
+    dsm_to_ases = dict(
+        df.drop_nulls("DSM")
+        .group_by("DSM")
+        .agg(pl.col("ASE").drop_nulls().unique().sort())
+        .iter_rows()
+    )
+    dsm_to_ases["All DSMs"] = df.schema["ASE"].categories.to_list()
+
+    terr_map = {
+        (dsm, ase): territories
+        for dsm, ase, territories in df.drop_nulls(["DSM", "ASE"])
+        .group_by(["DSM", "ASE"])
+        .agg(pl.col("SO_Territory").drop_nulls().unique().sort())
+        .iter_rows()
+    }
+    for dsm, territories in (
+        df.drop_nulls("DSM")
+        .group_by("DSM")
+        .agg(pl.col("SO_Territory").drop_nulls().unique().sort())
+        .iter_rows()
+    ):
+        terr_map[(dsm, "All ASEs")] = territories
+    terr_map[("All DSMs", "All ASEs")] = df.schema["SO_Territory"].categories.to_list()
+
+    return df, dsm_to_ases, terr_map
+
+df, dsm_to_ases, terr_map = load_data()
+
+def kpi_totals(lf):
+    # Filter, row count, sums and means run as one streaming query: the rows are
+    # swept once and the filtered frame is never materialised
+    totals = lf.select(
+        pl.len().alias("rows"),
+        pl.col(SUM_COLS).cast(pl.Float64).sum(),  # accumulate int32 columns without overflow
+        pl.col(MEAN_COLS).mean(),
+    ).collect(engine="streaming").row(0, named=True)
+    return totals if totals.pop("rows") else None
 
-df = load_data()
+@st.cache_data
+def global_summary():
+    return kpi_totals(df.lazy())
+
+# Selections are few and users flip back and forth, so memoise the filter step per
+# (dsm, ase, territory). Only the aggregated row is kept, not the filtered frame.
+@st.cache_data(max_entries=64)
+def filtered_totals(dsm, ase, territory):
+    selections = [
+        ("DSM", dsm, "All DSMs"),
+        ("ASE", ase, "All ASEs"),
+        ("SO_Territory", territory, "All Territories"),
+    ]
+    predicates = [pl.col(col) == value for col, value, all_label in selections if value != all_label]
+    lf = df.lazy()
+    if predicates:
+        lf = lf.filter(predicates)
+    return kpi_totals(lf)
+
+# Secondary totals per ASE / territory over the whole dataset, independent of filters
+@st.cache_data
+def top_bottom_stats():
+    ase_stats = (
+        df.drop_nulls("ASE")
+        .group_by("ASE")
+        .agg(pl.col("Secondary INR Actual").sum())
+        .with_columns(pl.col("ASE").cast(pl.String))
+    )
+    territory_stats = (
+        df.drop_nulls("SO_Territory")
+        .group_by("SO_Territory")
+        .agg(pl.col("Secondary INR Actual").sum())
+        .with_columns(pl.col("SO_Territory").cast(pl.String))
+    )
+    return ase_stats, territory_stats
 
 st.title("🔍 KPI Dependency & Root Cause Analyzer")
 
@@ -14,51 +153,32 @@ st.title("🔍 KPI Dependency & Root Cause Analyzer")
 st.sidebar.header("📌 Select Filters")
 
 # 1. Select DSM first
-dsm_list = sorted(df['DSM'].dropna().unique()) 
+dsm_list = df.schema["DSM"].categories.to_list()
 selected_dsm = st.sidebar.selectbox("Select DSM", ["All DSMs"] + dsm_list)
 
 # 2. All ASE filter immediately after dsm
-if selected_dsm == "All DSMs":
-    ase_list = sorted(df['ASE'].dropna().unique()) 
-else:
-    ase_df = df[df['DSM'] == selected_dsm]
-    ase_list = sorted(ase_df['ASE'].dropna().unique()) 
+ase_list = dsm_to_ases[selected_dsm]
 selected_ase = st.sidebar.selectbox("Select ASE", ["All ASEs"] + ase_list)
 
 # 3. Territory should appear only if a specific ASE is selected
-if selected_ase != "All ASEs":
-    territory_df = df[(df['DSM'] == selected_dsm) & (df['ASE'] == selected_ase)]
-
-    territory_list = sorted(territory_df['SO_Territory'].dropna().unique()) 
-    selected_territory = st.sidebar.selectbox("Select Territory", ["All Territories"] + territory_list)
-elif selected_dsm != "All DSMs":
-    territory_df = df[df['DSM'] == selected_dsm]
-    territory_list = sorted(territory_df['SO_Territory'].dropna().unique()) 
-    selected_territory = st.sidebar.selectbox("Select Territory", ["All Territories"] + territory_list)
-else:
-    territory_list = sorted(df['SO_Territory'].dropna().unique()) 
-    selected_territory = st.sidebar.selectbox("Select Territory", ["All Territories"] + territory_list)
+territory_list = terr_map.get((selected_dsm, selected_ase), [])
+selected_territory = st.sidebar.selectbox("Select Territory", ["All Territories"] + territory_list)
 
 # --- Apply Filters --- 
-filtered_df = df.copy()
-
-if selected_dsm != "All DSMs":
-    filtered_df = filtered_df[filtered_df['DSM'] == selected_dsm]
-
-if selected_ase != "All ASEs":
-    filtered_df = filtered_df[filtered_df['ASE'] == selected_ase]
-
-if selected_territory != "All Territories":
-    filtered_df = filtered_df[filtered_df['SO_Territory'] == selected_territory]
+# The unfiltered landing view never changes, so its totals have their own cache entry
+if (selected_dsm, selected_ase, selected_territory) == ("All DSMs", "All ASEs", "All Territories"):
+    totals = global_summary()
+else:
+    totals = filtered_totals(selected_dsm, selected_ase, selected_territory)
 
-if filtered_df.empty:
+if totals is None:
     st.error("No data found for your selection.")
     st.stop()
 
 # --- Summary Cards --- 
-total_manpower_plan = int(filtered_df["Manpower Plan"].sum()) if "Manpower Plan" in filtered_df else 0
-vacant_positions = total_manpower_plan - int(filtered_df["Manpower Actual"].sum()) if "Manpower Actual" in filtered_df else 0
-total_secondary = float(filtered_df["Secondary INR Actual"].sum()) if "Secondary INR Actual" in filtered_df else 0
+total_manpower_plan = int(totals["Manpower Plan"])
+vacant_positions = total_manpower_plan - int(totals["Manpower Actual"])
+total_secondary = float(totals["Secondary INR Actual"])
 
 col1, col2, col3 = st.columns(3)
 
@@ -74,50 +194,49 @@ with col3:
 st.markdown("---")
 
 # --- Actual Values --- 
-def sum_or_zero(col): 
-    return filtered_df[col].sum() if col in filtered_df else 0.0
-
-mp_actual = sum_or_zero("Manpower Actual")
-mandays_actual = sum_or_zero("Mandays Actual")
-routes_actual = sum_or_zero("Unique Routes Actual")
-callage_actual = sum_or_zero("Unique Callage Actual")
-prod_actual = sum_or_zero("Productivity Actual")
-sec_actual = sum_or_zero("Secondary INR Actual")
-ubo_actual = sum_or_zero("UBO Actual")
-uls_retailer = sum_or_zero("ULS Retailer")
-uls_db = sum_or_zero("ULS DB")
-tp_per_outlet = filtered_df["TP per Outlet Actual"].mean() if "TP per Outlet Actual" in filtered_df else 0.0
+mp_actual = totals["Manpower Actual"]
+mandays_actual = totals["Mandays Actual"]
+routes_actual = totals["Unique Routes Actual"]
+callage_actual = totals["Unique Callage Actual"]
+prod_actual = totals["Productivity Actual"]
+sec_actual = totals["Secondary INR Actual"]
+ubo_actual = totals["UBO Actual"]
+uls_retailer = totals["ULS Retailer"]
+uls_db = totals["ULS DB"]
+tp_per_outlet = totals["TP per Outlet Actual"]
 
 lines_per_outlet_actual = uls_retailer / ubo_actual if ubo_actual > 0 else 0
 lines_per_db_actual = uls_db / ubo_actual if ubo_actual > 0 else 0
 lines_per_average = (lines_per_outlet_actual + lines_per_db_actual) / 2
 
 # --- Plan Values --- 
-mp_plan = sum_or_zero("Manpower Plan")
+mp_plan = totals["Manpower Plan"]
 mandays_plan = mp_plan * 24
-routes_plan = sum_or_zero("Unique Routes Plan")
+routes_plan = totals["Unique Routes Plan"]
 callage_plan = routes_plan * 40
 prod_plan = callage_plan * 0.8
-sec_plan = sum_or_zero("Secondary INR Plan")
+sec_plan = totals["Secondary INR Plan"]
 uls_db_plan = lines_per_db_actual if ubo_actual > 0 else 0
 lines_per_outlet_plan = uls_db_plan * 0.8
 lines_per_average_plan = (lines_per_outlet_plan + uls_db_plan) / 2
-tp_per_outlet_plan = filtered_df["TP per Outlet Plan"].mean() if "TP per Outlet Plan" in filtered_df else 0.0
-ubo_plan = sum_or_zero("UBO Plan") if "UBO Plan" in df else 0
+tp_per_outlet_plan = totals["TP per Outlet Plan"]
+ubo_plan = totals["UBO Plan"]
 
 # --- Evaluation Flags --- 
-def is_good(actual, plan, threshold=0.9):
-    return actual >= threshold * plan if plan != 0 else False
-
-flags = {
-    "callage": is_good(callage_actual, callage_plan),
-    "routes": is_good(routes_actual, routes_plan),
-    "productivity": is_good(prod_actual, prod_plan),
-    "lines": is_good(lines_per_average, lines_per_average_plan),
-    "tp": is_good(tp_per_outlet, tp_per_outlet_plan),
-    "secondary": is_good(sec_actual, sec_plan),
-    "manday": (mandays_actual >= mp_plan * 24) if mp_plan > 0 else False
-}
+# A KPI is good when actual >= threshold * plan (never when plan is 0);
+# mandays must hit the full plan, the rest 90% of it
+flag_names = ["callage", "routes", "productivity", "lines", "tp", "secondary", "manday"]
+flag_actual = np.array(
+    [callage_actual, routes_actual, prod_actual, lines_per_average, tp_per_outlet, sec_actual, mandays_actual],
+    dtype="float64",
+)
+flag_plan = np.array(
+    [callage_plan, routes_plan, prod_plan, lines_per_average_plan, tp_per_outlet_plan, sec_plan, mp_plan * 24],
+    dtype="float64",
+)
+flag_threshold = np.array([0.9, 0.9, 0.9, 0.9, 0.9, 0.9, 1.0])
+
+flags = dict(zip(flag_names, np.where(flag_plan != 0, flag_actual >= flag_threshold * flag_plan, False)))
 
 # --- Main Layout --- 
 col1, col2 = st.columns([2, 1])
@@ -188,22 +307,44 @@ with col1:
         ("Secondary INR", sec_actual, sec_plan),
     ]
 
-    summary_df = pd.DataFrame(kpis, columns=['Metric', 'Actual', 'Plan'])
-    summary_df["% Achieved"] = (summary_df["Actual"] / summary_df["Plan"] * 100).round(2).astype(str) + "%"
+    metric_names, actuals, plans = zip(*kpis)
+    actuals = np.array(actuals, dtype="float64")
+    plans = np.array(plans, dtype="float64")
+
+    summary_df = pd.DataFrame({
+        "Metric": np.array(metric_names, dtype=object),
+        "Actual": actuals,
+        "Plan": plans,
+        "% Achieved": actuals / np.where(plans == 0, np.nan, plans) * 100,
+    })
 
-    st.dataframe(summary_df, use_container_width=True)
+    # Kept numeric so the table sorts correctly; the % suffix is display-only
+    st.dataframe(
+        summary_df,
+        column_config={"% Achieved": st.column_config.NumberColumn(format="%.2f%%")},
+        use_container_width=True,
+    )
 
 with col2:
     st.markdown("<h2 style='text-align: center;'>🏅 Top Performers and Bottom Performers</h2>", unsafe_allow_html=True)
 
-    ase_stats = df.groupby("ASE")["Secondary INR Actual"].sum()
-    territory_stats = df.groupby("SO_Territory")["Secondary INR Actual"].sum()
-
-    top_1_ase = ase_stats.sort_values(ascending=False).head(1).reset_index()
-    bottom_3_ase = ase_stats.sort_values(ascending=False).tail(3).reset_index()
-
-    top_1_territory = territory_stats.sort_values(ascending=False).head(1).reset_index()
-    bottom_3_territory = territory_stats.sort_values(ascending=False).tail(3).reset_index()
+    ase_stats, territory_stats = top_bottom_stats()
+
+    # top_k/bottom_k select without sorting every group; only the picked rows get ordered.
+    # The key column breaks ties, since group_by output order is not fixed
+    top_1_ase = ase_stats.top_k(1, by=["Secondary INR Actual", "ASE"]).to_pandas(use_pyarrow_extension_array=True)
+    bottom_3_ase = (
+        ase_stats.bottom_k(3, by=["Secondary INR Actual", "ASE"])
+        .sort(["Secondary INR Actual", "ASE"], descending=True)
+        .to_pandas(use_pyarrow_extension_array=True)
+    )
+
+    top_1_territory = territory_stats.top_k(1, by=["Secondary INR Actual", "SO_Territory"]).to_pandas(use_pyarrow_extension_array=True)
+    bottom_3_territory = (
+        territory_stats.bottom_k(3, by=["Secondary INR Actual", "SO_Territory"])
+        .sort(["Secondary INR Actual", "SO_Territory"], descending=True)
+        .to_pandas(use_pyarrow_extension_array=True)
+    )
 
     st.markdown("<h4 style='text-align: center;'>Top 1 ASE</h4>", unsafe_allow_html=True)
     st.dataframe(top_1_ase, use_container_width=True)